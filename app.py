@@ -1,15 +1,103 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
 import time
-from typing import Dict, Any, Optional, List
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Tuple
 
 import httpx
-from fastapi import FastAPI, HTTPException, Query
+import orjson
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.backends.redis import RedisBackend
+from redis import asyncio as aioredis
+
+from scoring import best_pairs_per_chain, compute_score, pick_best_pair_from_list
+
+logger = logging.getLogger(__name__)
 
 # DexScreener endpoints
 DEX_TOKEN = "https://api.dexscreener.com/latest/dex/tokens/{address}"
 DEX_SEARCH = "https://api.dexscreener.com/latest/dex/search?q={q}"
 
-app = FastAPI(title="Meme Scout Backend", version="0.2.1")
+# mint-адрес Solana: 32–44 символа base58, отделённый запятыми/пробелами
+_ADDR_RE = re.compile(r"(?<![^,\s])[1-9A-HJ-NP-Za-km-z]{32,44}(?![^,\s])")
+
+# сколько воркеров /score/bulk разбирают очередь адресов (= запросов в полёте)
+BULK_WORKERS = 8
+
+# in-process кэш ответов DexScreener: url -> (monotonic ts, payload)
+CACHE_TTL = 10.0
+CACHE_MAX_ENTRIES = 4096
+_CACHE: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+# локи промахов по url + сколько корутин их держат/ждут; лок живёт, пока есть кто-то
+_CACHE_LOCKS: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+# общий для всех воркеров кэш ответов /score; без REDIS_URL — в памяти процесса
+REDIS_URL = os.getenv("REDIS_URL")
+SCORE_CACHE_TTL = 10
+SCORE_CACHE_MAX_ENTRIES = 4096
+
+
+class BoundedInMemoryBackend(InMemoryBackend):
+    """
+    InMemoryBackend fastapi-cache2 удаляет запись, только когда её заново
+    читают, — ключи, которые больше не спрашивают, копятся вечно. Здесь,
+    как и в _evict_cache, при переполнении выкидываем протухшие записи,
+    а если их мало — самые старые 25%.
+    """
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        await super().set(key, value, expire)
+        store = self._store
+        if len(store) <= SCORE_CACHE_MAX_ENTRIES:
+            return
+        async with self._lock:
+            now = self._now
+            for k in [k for k, v in store.items() if v.ttl_ts < now]:
+                del store[k]
+            if len(store) > SCORE_CACHE_MAX_ENTRIES:
+                oldest = sorted(store, key=lambda k: store[k].ttl_ts)[: len(store) // 4]
+                for k in oldest:
+                    del store[k]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # один долгоживущий клиент на весь процесс: keep-alive соединения
+    # к DexScreener переиспользуются, без TLS-рукопожатия на каждый запрос;
+    # по HTTP/2 параллельные запросы /score/bulk мультиплексируются в одно соединение
+    app.state.client = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(10.0),
+        limits=httpx.Limits(
+            max_connections=100, max_keepalive_connections=50, keepalive_expiry=30.0
+        ),
+    )
+    redis = aioredis.from_url(REDIS_URL) if REDIS_URL else None
+    FastAPICache.init(
+        RedisBackend(redis) if redis is not None else BoundedInMemoryBackend(),
+        prefix="meme-scout",
+    )
+    try:
+        yield
+    finally:
+        await app.state.client.aclose()
+        if redis is not None:
+            await redis.close()
+
+
+app = FastAPI(
+    title="Meme Scout Backend",
+    version="0.2.1",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # CORS (чтобы расширение Chrome могло стучаться к бэку)
 app.add_middleware(
@@ -24,121 +112,69 @@ app.add_middleware(
 # ------------ helpers ------------
 
 async def fetch_json(url: str) -> Dict[str, Any]:
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url)
-        r.raise_for_status()
-        return r.json()
+    r = await app.state.client.get(url)
+    r.raise_for_status()
+    return orjson.loads(r.content)
 
 
-def pick_best_pair_from_list(
-    pairs: List[Dict[str, Any]], prefer_chain: str = "sol"
-) -> Optional[Dict[str, Any]]:
+def _evict_cache() -> None:
     """
-    Берём лучшую (по ликвидности) пару, предпочитая указанный чейн.
-    DexScreener может отдавать ключ chainId ("solana") или chain ("sol").
+    Выкидываем самые старые 25% записей, когда кэш разросся.
     """
-    if not pairs:
-        return None
-
-    def liq_usd(p: Dict[str, Any]) -> float:
-        liq = p.get("liquidity") or {}
-        # иногда liquidity = {"usd": 12345}, иногда None
-        return float((liq.get("usd") if isinstance(liq, dict) else 0) or 0)
-
-    # сначала фильтруем предпочитаемый чейн (sol/solana)
-    pref = [
-        p
-        for p in pairs
-        if (p.get("chainId") or p.get("chain") or "").lower().startswith(
-            prefer_chain.lower()
-        )
-    ]
-    candidates = pref if pref else pairs
-    candidates.sort(key=liq_usd, reverse=True)
-    return candidates[0]
-
-
-def compute_score(pair: Dict[str, Any]) -> Dict[str, Any]:
+    if len(_CACHE) <= CACHE_MAX_ENTRIES:
+        return
+    oldest = sorted(_CACHE, key=lambda k: _CACHE[k][0])[: len(_CACHE) // 4]
+    for k in oldest:
+        del _CACHE[k]
+
+
+async def cached_fetch(url: str, ttl: float = CACHE_TTL) -> Dict[str, Any]:
     """
-    Простая эвристика 0–100 по базовым метрикам пары.
+    fetch_json с TTL-кэшем. Параллельные запросы одного url ждут
+    на общем локе и получают один и тот же ответ (без thundering herd).
     """
-    liq = ((pair.get("liquidity") or {}).get("usd") or 0) or 0
-    tx5 = (pair.get("txns") or {}).get("m5") or {}
-    buys = float(tx5.get("buys", 0) or 0)
-    sells = float(tx5.get("sells", 0) or 0)
-    total = buys + sells
-    tpm = total / 5.0 if total > 0 else 0.0  # tx per minute (за 5 минут)
-    buy_ratio = buys / total if total > 0 else 0.0
-    pc = pair.get("priceChange") or {}
-    m5 = pc.get("m5")
-    h1 = pc.get("h1")
-    boosted = bool(pair.get("boosts") or 0)
-    created_ms = pair.get("pairCreatedAt") or 0
-    age_min = max(0, (int(time.time() * 1000) - created_ms) / 60000) if created_ms else None
-
-    s = 0
-    reasons: List[str] = []
-
-    # ликвидность
-    if liq >= 25000:
-        s += 15
-        reasons.append("liq≥25k")
-    elif liq >= 10000:
-        s += 8
-        reasons.append("liq≥10k")
-
-    # активность
-    if tpm >= 15:
-        s += 10
-        reasons.append("tx/min≥15")
-    elif tpm >= 8:
-        s += 6
-        reasons.append("tx/min≥8")
-
-    # соотношение покупок
-    if buy_ratio >= 0.60:
-        s += 10
-        reasons.append("buy≥60%")
-    elif buy_ratio >= 0.55:
-        s += 6
-        reasons.append("buy≥55%")
-
-    # импульс
-    if isinstance(m5, (int, float)) and m5 > 0:
-        s += 5
-        reasons.append("m5↑")
-    if isinstance(h1, (int, float)) and h1 > 0:
-        s += 5
-        reasons.append("h1↑")
-
-    if boosted:
-        s += 5
-        reasons.append("boosted")
-
-    if age_min is not None and age_min <= 60:
-        s += 5
-        reasons.append("new≤60m")
-
-    score_pct = max(0, min(100, int(round(s))))
-    risk = "high" if score_pct < 40 else "mid" if score_pct < 70 else "low"
-
-    return {
-        "score": score_pct,
-        "risk": risk,
-        "reasons": reasons,
-        "flags": {
-            "hasWhales": False,  # зарезервировано под радар кошельков
-            "fastMigration": bool(age_min is not None and age_min <= 10),
-        },
-        "metrics": {
-            "liq": float(liq),
-            "tpm": float(round(tpm, 2)),
-            "buyRatio": float(round(buy_ratio, 3)),
-            "m5": m5,
-            "h1": h1,
-            "ageMin": age_min,
-        },
-    }
+    hit = _CACHE.get(url)
+    if hit is not None and time.monotonic() - hit[0] < ttl:
+        return hit[1]
+    lock, users = _CACHE_LOCKS.get(url) or (asyncio.Lock(), 0)
+    _CACHE_LOCKS[url] = (lock, users + 1)
+    try:
+        async with lock:
+            hit = _CACHE.get(url)
+            if hit is not None and time.monotonic() - hit[0] < ttl:
+                return hit[1]
+            data = await fetch_json(url)
+            # сразу ужимаем pairs, чтобы в кэше не держать сотни ненужных пар
+            data["pairs"] = best_pairs_per_chain(data.get("pairs") or [])
+            _CACHE[url] = (time.monotonic(), data)
+    finally:
+        # последний ушедший (в т.ч. по ошибке fetch_json) убирает лок,
+        # иначе url-ы с 429/5xx копились бы в _CACHE_LOCKS без предела
+        lock, users = _CACHE_LOCKS[url]
+        if users > 1:
+            _CACHE_LOCKS[url] = (lock, users - 1)
+        else:
+            del _CACHE_LOCKS[url]
+    _evict_cache()
+    return data
+
+
+def score_cache_key(address: str, chain: str) -> str:
+    """
+    Ключ кэша /score — только (address, chain), без остального запроса
+    (заголовки, IP и прочее в ключ и в Redis не попадают). chain сравнивается
+    без учёта регистра, так что sol/SOL/Sol — один ключ.
+    """
+    raw = f"{address}\x00{chain.lower()}".encode()
+    return f"{FastAPICache.get_prefix()}:score:{hashlib.sha256(raw).hexdigest()[:32]}"
+
+
+def score_etag(payload: Dict[str, Any]) -> str:
+    # ETag от оценки без updatedAt: пересчёт той же пары после истечения TTL
+    # даёт тот же ETag, и клиент продолжает получать 304. blake2b, а не hash(),
+    # — значение одинаковое у всех воркеров
+    raw = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    return '"' + hashlib.blake2b(raw, digest_size=8).hexdigest() + '"'
 
 
 # ------------ endpoints ------------
@@ -149,18 +185,50 @@ async def healthz():
 
 
 @app.get("/score")
-async def score(address: str = Query(...), chain: str = "sol"):
+async def score(
+    address: str = Query(...),
+    chain: str = "sol",
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Оценка по mint-адресу.
+    Готовое тело ответа живёт в кэше SCORE_CACHE_TTL секунд рядом со своим
+    ETag; клиент, приславший If-None-Match с тем же ETag, получает пустой 304.
+    ETag не зависит от updatedAt — меняется только вместе с оценкой.
     """
-    data = await fetch_json(DEX_TOKEN.format(address=address))
-    pair = pick_best_pair_from_list(data.get("pairs") or [], prefer_chain=chain)
-    if not pair:
-        raise HTTPException(status_code=404, detail="Token/pair not found")
-    payload = compute_score(pair)
-    payload["address"] = address
-    payload["updatedAt"] = int(time.time())
-    return payload
+    backend = FastAPICache.get_backend()
+    key = score_cache_key(address, chain)
+    # кэш — оптимизация, а не зависимость: недоступный Redis = промах
+    try:
+        ttl, cached = await backend.get_with_ttl(key)
+    except Exception:
+        logger.warning("score cache get failed for %s", key, exc_info=True)
+        ttl, cached = 0, None
+    # в кэше лежит b'"<etag>"\n<тело>' (в теле от orjson сырых переводов строк нет)
+    if cached and cached.startswith(b'"'):
+        raw_etag, _, body = cached.partition(b"\n")
+        etag = raw_etag.decode()
+    else:
+        data = await cached_fetch(DEX_TOKEN.format(address=address))
+        pair = pick_best_pair_from_list(data.get("pairs") or [], prefer_chain=chain)
+        if not pair:
+            raise HTTPException(status_code=404, detail="Token/pair not found")
+        payload = compute_score(pair)
+        payload["address"] = address
+        etag = score_etag(payload)
+        payload["updatedAt"] = int(time.time())
+        body = orjson.dumps(payload)
+        ttl = SCORE_CACHE_TTL
+        try:
+            await backend.set(key, etag.encode() + b"\n" + body, expire=SCORE_CACHE_TTL)
+        except Exception:
+            logger.warning("score cache set failed for %s", key, exc_info=True)
+
+    headers = {"ETag": etag, "Cache-Control": f"max-age={max(ttl, 0)}"}
+    client_etags = {t.strip().removeprefix("W/") for t in (if_none_match or "").split(",")}
+    if etag in client_etags or "*" in client_etags:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @app.get("/score/by-name")
@@ -169,7 +237,7 @@ async def score_by_name(q: str = Query(..., description="Ticker or name"), chain
     Оценка по тикеру/имени.
     Отдаём лучшую по ликвидности пару, предпочитая указанный чейн (по умолчанию sol/solana).
     """
-    data = await fetch_json(DEX_SEARCH.format(q=q))
+    data = await cached_fetch(DEX_SEARCH.format(q=q))
     pairs = data.get("pairs") or []
     pair = pick_best_pair_from_list(pairs, prefer_chain=chain)
     if not pair:
@@ -182,19 +250,40 @@ async def score_by_name(q: str = Query(..., description="Ticker or name"), chain
     payload["address"] = address
     payload["symbol"] = (pair.get("baseToken") or {}).get("symbol")
     payload["updatedAt"] = int(time.time())
-    return payload
+    # отдаём Response сами — FastAPI не гоняет ответ через jsonable_encoder
+    return ORJSONResponse(payload)
 
 
 @app.get("/score/bulk")
 async def score_bulk(addresses: str = Query(...)):
     """
     Пакетная оценка: /score/bulk?addresses=addr1,addr2,...
+    Строки, не похожие на mint-адрес Solana, пропускаются; максимум 50 адресов.
     """
-    addrs = [a.strip() for a in addresses.split(",") if a.strip()]
+    # один проход регуляркой: заодно отсеиваем мусор до запросов к DexScreener
+    addrs = _ADDR_RE.findall(addresses)[:50]
+    # очередь (индекс, адрес) + пул воркеров: не больше BULK_WORKERS запросов
+    # к DexScreener одновременно, порядок результатов — по индексу
+    queue: "asyncio.Queue[Tuple[int, str]]" = asyncio.Queue()
+    for item in enumerate(addrs):
+        queue.put_nowait(item)
+    results: List[Any] = [None] * len(addrs)
+
+    async def worker() -> None:
+        while not queue.empty():
+            idx, a = queue.get_nowait()
+            try:
+                results[idx] = await cached_fetch(DEX_TOKEN.format(address=a))
+            except Exception as e:
+                results[idx] = e
+
+    await asyncio.gather(*(worker() for _ in range(min(BULK_WORKERS, len(addrs)))))
+
     out: List[Dict[str, Any]] = []
-    for a in addrs[:50]:
+    for a, data in zip(addrs, results):
         try:
-            data = await fetch_json(DEX_TOKEN.format(address=a))
+            if isinstance(data, BaseException):
+                raise data
             pair = pick_best_pair_from_list(data.get("pairs") or [])
             if not pair:
                 out.append({"address": a, "error": "not_found"})
@@ -205,4 +294,4 @@ async def score_bulk(addresses: str = Query(...)):
             out.append(payload)
         except Exception as e:
             out.append({"address": a, "error": str(e)})
-    return {"results": out}
+    return ORJSONResponse({"results": out})
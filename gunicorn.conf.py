@@ -0,0 +1,37 @@
+import os
+
+# gunicorn -c gunicorn.conf.py app:app
+# по воркеру на ядро; общий кэш /score между воркерами — через REDIS_URL
+
+_PIN_CPUS = hasattr(os, "sched_setaffinity")
+
+bind = os.getenv("BIND", "0.0.0.0:8080")
+workers = int(os.getenv("WEB_CONCURRENCY") or 0) or (
+    len(os.sched_getaffinity(0)) if _PIN_CPUS else os.cpu_count() or 1
+)
+worker_class = "uvicorn_worker.UvicornWorker"  # uvloop + httptools из uvicorn[standard]
+# слушающий сокет один (его создаёт мастер, воркеры наследуют), так что
+# SO_REUSEPORT не раскидывает соединения по воркерам — он лишь позволяет
+# второму мастеру сесть на тот же порт при rolling-рестарте
+reuse_port = True
+keepalive = 5
+
+
+def pre_fork(server, worker):
+    # ядро выбирает мастер: самое свободное среди живых воркеров, при равенстве —
+    # с меньшим номером. Воркер, перезапущенный после падения/таймаута, займёт
+    # освободившееся ядро, а не чужое
+    if not _PIN_CPUS:
+        return
+    held = [getattr(w, "cpu", None) for w in server.WORKERS.values()]
+    cpus = sorted(os.sched_getaffinity(0))
+    worker.cpu = min(cpus, key=lambda c: (held.count(c), c))
+
+
+def post_fork(server, worker):
+    # прибиваем воркер к своему ядру — горячий кэш CPU не скачет между ядрами
+    cpu = getattr(worker, "cpu", None)
+    if cpu is None:
+        return
+    os.sched_setaffinity(0, {cpu})
+    server.log.info("worker %s pinned to cpu %s", worker.pid, cpu)
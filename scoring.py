@@ -0,0 +1,169 @@
+import time
+from typing import Dict, Any, Optional, List, Set, Tuple
+
+# лестницы порогов скоринга: (порог, очки, тег), по убыванию порога
+LIQ_TIERS = ((25000, 15, "liq≥25k"), (10000, 8, "liq≥10k"))
+TPM_TIERS = ((15, 10, "tx/min≥15"), (8, 6, "tx/min≥8"))
+BUY_TIERS = ((0.60, 10, "buy≥60%"), (0.55, 6, "buy≥55%"))
+# бонусы (по BONUS_PTS): m5 > 0, h1 > 0, буст, пара моложе NEW_PAIR_MIN минут
+BONUS_PTS = 5
+BONUS_TAGS = ("m5↑", "h1↑", "boosted", "new≤60m")
+NEW_PAIR_MIN = 60
+FAST_MIGRATION_MIN = 10
+
+# те же лестницы, разложенные по именам: compute_score сравнивает с ними
+# напрямую, без цикла по кортежам на каждый вызов
+(_LIQ_HI, _LIQ_HI_PTS, _LIQ_HI_TAG), (_LIQ_LO, _LIQ_LO_PTS, _LIQ_LO_TAG) = LIQ_TIERS
+(_TPM_HI, _TPM_HI_PTS, _TPM_HI_TAG), (_TPM_LO, _TPM_LO_PTS, _TPM_LO_TAG) = TPM_TIERS
+(_BUY_HI, _BUY_HI_PTS, _BUY_HI_TAG), (_BUY_LO, _BUY_LO_PTS, _BUY_LO_TAG) = BUY_TIERS
+_M5_TAG, _H1_TAG, _BOOSTED_TAG, _NEW_TAG = BONUS_TAGS
+
+_EMPTY: Dict[str, Any] = {}
+
+def pick_best_pair_from_list(
+    pairs: List[Dict[str, Any]], prefer_chain: str = "sol"
+) -> Optional[Dict[str, Any]]:
+    """
+    Берём лучшую (по ликвидности) пару, предпочитая указанный чейн.
+    DexScreener может отдавать ключ chainId ("solana") или chain ("sol").
+    Один проход без сортировки: отдельно держим лучшую пару на нужном
+    чейне и лучшую вообще (фолбэк, если на нужном чейне пар нет).
+    """
+    prefer = prefer_chain.lower()
+    # chainId у пар повторяются: lower()/startswith — один раз на id за вызов
+    matched: Set[str] = set()
+    skipped: Set[str] = set()
+    best_pref: Optional[Dict[str, Any]] = None
+    best_pref_liq = -1.0
+    best_any: Optional[Dict[str, Any]] = None
+    best_any_liq = -1.0
+
+    for p in pairs:
+        chain = p.get("chainId") or p.get("chain") or ""
+        if chain in matched:
+            is_pref = True
+        elif chain in skipped:
+            is_pref = False
+        elif chain.lower().startswith(prefer):
+            matched.add(chain)
+            is_pref = True
+        else:
+            skipped.add(chain)
+            is_pref = False
+        # фолбэк нужен, только пока пары на нужном чейне не встретились
+        if not is_pref and best_pref is not None:
+            continue
+
+        liq = p.get("liquidity") or {}
+        # иногда liquidity = {"usd": 12345}, иногда None
+        liq_usd = float((liq.get("usd") if isinstance(liq, dict) else 0) or 0)
+        if is_pref:
+            if liq_usd > best_pref_liq:
+                best_pref, best_pref_liq = p, liq_usd
+        elif liq_usd > best_any_liq:
+            best_any, best_any_liq = p, liq_usd
+
+    return best_pref if best_pref is not None else best_any
+
+
+def best_pairs_per_chain(pairs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Оставляем по одной (самой ликвидной) паре на каждый чейн, в исходном порядке.
+    pick_best_pair_from_list на таком списке выбирает ту же пару, что и на полном,
+    а в кэше лежат единицы пар вместо сотен у мультичейн-токенов.
+    """
+    best: Dict[str, Tuple[float, int]] = {}  # chain -> (liq, индекс пары)
+    for i, p in enumerate(pairs):
+        liq = p.get("liquidity") or {}
+        liq_usd = float((liq.get("usd") if isinstance(liq, dict) else 0) or 0)
+        chain = p.get("chainId") or p.get("chain") or ""
+        cur = best.get(chain)
+        if cur is None or liq_usd > cur[0]:
+            best[chain] = (liq_usd, i)
+    if len(best) == len(pairs):
+        return pairs
+    return [pairs[i] for i in sorted(i for _, i in best.values())]
+
+
+def compute_score(pair: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Простая эвристика 0–100 по базовым метрикам пары.
+    """
+    # отсутствующие поля -> общий пустой dict (только читаем), без мусорных {}
+    liq = float((pair.get("liquidity") or _EMPTY).get("usd") or 0)
+    tx5 = (pair.get("txns") or _EMPTY).get("m5") or _EMPTY
+    buys = float(tx5.get("buys") or 0)
+    sells = float(tx5.get("sells") or 0)
+    total = buys + sells
+    tpm = total / 5.0 if total > 0 else 0.0  # tx per minute (за 5 минут)
+    buy_ratio = buys / total if total > 0 else 0.0
+    pc = pair.get("priceChange") or _EMPTY
+    m5 = pc.get("m5")
+    h1 = pc.get("h1")
+    boosted = bool(pair.get("boosts") or 0)
+    created_ms = pair.get("pairCreatedAt") or 0
+    age_min = max(0, (int(time.time() * 1000) - created_ms) / 60000) if created_ms else None
+
+    s = 0
+    reasons: List[str] = []
+
+    # ликвидность
+    if liq >= _LIQ_HI:
+        s += _LIQ_HI_PTS
+        reasons.append(_LIQ_HI_TAG)
+    elif liq >= _LIQ_LO:
+        s += _LIQ_LO_PTS
+        reasons.append(_LIQ_LO_TAG)
+
+    # активность
+    if tpm >= _TPM_HI:
+        s += _TPM_HI_PTS
+        reasons.append(_TPM_HI_TAG)
+    elif tpm >= _TPM_LO:
+        s += _TPM_LO_PTS
+        reasons.append(_TPM_LO_TAG)
+
+    # соотношение покупок
+    if buy_ratio >= _BUY_HI:
+        s += _BUY_HI_PTS
+        reasons.append(_BUY_HI_TAG)
+    elif buy_ratio >= _BUY_LO:
+        s += _BUY_LO_PTS
+        reasons.append(_BUY_LO_TAG)
+
+    # импульс
+    if isinstance(m5, (int, float)) and m5 > 0:
+        s += BONUS_PTS
+        reasons.append(_M5_TAG)
+    if isinstance(h1, (int, float)) and h1 > 0:
+        s += BONUS_PTS
+        reasons.append(_H1_TAG)
+
+    if boosted:
+        s += BONUS_PTS
+        reasons.append(_BOOSTED_TAG)
+
+    if age_min is not None and age_min <= NEW_PAIR_MIN:
+        s += BONUS_PTS
+        reasons.append(_NEW_TAG)
+
+    score_pct = max(0, min(100, s))
+    risk = "high" if score_pct < 40 else "mid" if score_pct < 70 else "low"
+
+    return {
+        "score": score_pct,
+        "risk": risk,
+        "reasons": reasons,
+        "flags": {
+            "hasWhales": False,  # зарезервировано под радар кошельков
+            "fastMigration": bool(age_min is not None and age_min <= FAST_MIGRATION_MIN),
+        },
+        "metrics": {
+            "liq": liq,
+            "tpm": tpm,
+            "buyRatio": buy_ratio,
+            "m5": m5,
+            "h1": h1,
+            "ageMin": age_min,
+        },
+    }